@@ -1,13 +1,17 @@
 """
 CLI interface to run a workflow as a job.
 """
+import json
 import logging
-import random
+import os
 import shutil
 import subprocess
 import tarfile
+import tempfile
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Any, Dict, List, Optional, cast
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple, cast
 
 import typer
 from cwl_utils.parser import load_document_by_uri, save
@@ -35,6 +39,25 @@ from dirac_cwl_proto.utils import _get_metadata
 app = typer.Typer()
 console = Console()
 
+# Loggers are shared by all the jobs: get them once
+router_logger = logging.getLogger("JobRouter")
+wrapper_logger = logging.getLogger("JobWrapper")
+pre_process_logger = logging.getLogger("JobWrapper - Pre-process")
+post_process_logger = logging.getLogger("JobWrapper - Post-process")
+
+# Copy files in and out of the sandboxes by chunks of 2 MiB (tarfile defaults to 16 KiB)
+SANDBOX_COPY_BUFSIZE = 2 * 1024 * 1024
+
+# Read the umask once, before any thread is started: os.umask() can only be read by
+# setting it, which is process-wide
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+# Remove the job directories in the background: the job result does not depend on it
+cleanup_executor = ThreadPoolExecutor(max_workers=1)
+# Graveyards already checked for directories left over by a previous run
+reaped_graveyards: Set[Path] = set()
+
 # -----------------------------------------------------------------------------
 # dirac-cli commands
 # -----------------------------------------------------------------------------
@@ -58,6 +81,9 @@ def submit_job_client(
     local: Optional[bool] = typer.Option(
         True, help="Run the job locally instead of submitting it to the router"
     ),
+    verbose: Optional[bool] = typer.Option(
+        False, help="Print the full description of the job(s) before submitting them"
+    ),
 ):
     """
     Correspond to the dirac-cli command to submit jobs
@@ -97,12 +123,28 @@ def submit_job_client(
 
     parameters = []
     if parameter_path:
-        for parameter_p in parameter_path:
-            parameter = load_inputfile(parameter_p)
-
-            # Upload the local files to the sandbox store
-            sandbox_id = upload_local_input_files(parameter)
-
+        # Sandboxes are independent: upload them while the next parameters are loaded
+        uploaded_sandboxes: Dict[FrozenSet[Tuple[Path, str]], Future[str]] = {}
+        loaded_parameters = []
+        with ThreadPoolExecutor() as executor:
+            for parameter_p in parameter_path:
+                parameter = load_inputfile(parameter_p)
+
+                # Upload the local files to the sandbox store
+                sandbox_future = upload_local_input_files(
+                    parameter, executor, uploaded_sandboxes
+                )
+                loaded_parameters.append((parameter_p, parameter, sandbox_future))
+
+        for parameter_p, parameter, sandbox_future in loaded_parameters:
+            try:
+                sandbox_id = sandbox_future.result() if sandbox_future else None
+            except OSError as ex:
+                console.print(
+                    "[red]:heavy_multiplication_x:[/red] [bold]CLI:[/bold] "
+                    f"Failed to upload the local files of {parameter_p}:\n{ex}"
+                )
+                return typer.Exit(code=1)
             parameters.append(
                 JobParameterModel(
                     sandbox=[sandbox_id] if sandbox_id else None,
@@ -127,7 +169,8 @@ def submit_job_client(
     console.print(
         "[blue]:information_source:[/blue] [bold]CLI:[/bold] Submitting the job(s) to service..."
     )
-    print_json(job.model_dump_json(indent=4))
+    if verbose:
+        print_json(job.model_dump_json())
     if not submit_job_router(job):
         console.print(
             "[red]:heavy_multiplication_x:[/red] [bold]CLI:[/bold] Failed to run job(s)."
@@ -136,58 +179,115 @@ def submit_job_client(
     console.print("[green]:heavy_check_mark:[/green] [bold]CLI:[/bold] Job(s) done.")
 
 
-def upload_local_input_files(input_data: Dict[str, Any]) -> str | None:
+def _get_files(input_data: Dict[str, Any]) -> List[File]:
     """
-    Extract the files from the parameters.
+    Get the files from the inputs of a job, whether they are single or list inputs.
 
-    :param parameters: The parameters of the job
+    :param input_data: The CWL inputs of the job
 
     :return: The list of files
     """
-    Path("sandboxstore").mkdir(exist_ok=True)
-
-    # Get the files from the input data
-    files = []
-    for _, input_value in input_data.items():
+    files: List[File] = []
+    for input_value in input_data.values():
         if isinstance(input_value, list):
-            for item in input_value:
-                if isinstance(item, File):
-                    files.append(item)
+            files.extend(item for item in input_value if isinstance(item, File))
         elif isinstance(input_value, File):
             files.append(input_value)
+    return files
 
-    if not files:
-        return None
 
-    # Tar the files and upload them to the file catalog
-    sandbox_path = (
-        Path("sandboxstore") / f"input_sandbox_{random.randint(1000, 9999)}.tar.gz"
-    )
-    with tarfile.open(sandbox_path, "w:gz") as tar:
-        for file in files:
-            # TODO: path is not the only attribute to consider, but so far it is the only one used
-            if not file.path:
-                raise NotImplementedError("File path is not defined.")
+def upload_local_input_files(
+    input_data: Dict[str, Any],
+    executor: Executor,
+    uploaded_sandboxes: Dict[FrozenSet[Tuple[Path, str]], Future[str]],
+) -> Future[str] | None:
+    """
+    Extract the files from the parameters and upload them in the background.
 
-            file_path = Path(file.path.replace("file://", ""))
-            console.print(
-                f"\t\t[blue]:information_source:[/blue] Found {file_path} locally, uploading it to the sandbox store..."
-            )
-            tar.add(file_path, arcname=file_path.name)
-    console.print(
-        f"\t\t[blue]:information_source:[/blue] File(s) will be available through {sandbox_path}"
-    )
+    :param input_data: The parameters of the job
+    :param executor: The executor running the uploads
+    :param uploaded_sandboxes: The sandboxes already uploaded, by set of files and names
 
-    # Modify the location of the files to point to the future location on the worker node
+    :return: The future id of the sandbox
+    """
+    # Get the files from the input data
+    files = _get_files(input_data)
+    if not files:
+        return None
+
+    file_paths = []
     for file in files:
         # TODO: path is not the only attribute to consider, but so far it is the only one used
         if not file.path:
             raise NotImplementedError("File path is not defined.")
+        file_paths.append(Path(file.path.removeprefix("file://")))
+
+    # The parameters of a submission often share their input files (parameter sweeps):
+    # reuse the sandbox already uploaded for the same set of files, stored under the
+    # same names (a file can be reached through a link with another name)
+    sandbox_key = frozenset(
+        (file_path.resolve(), file_path.name) for file_path in file_paths
+    )
+    if sandbox_key in uploaded_sandboxes:
+        sandbox_future = uploaded_sandboxes[sandbox_key]
+        console.print(
+            "\t\t[blue]:information_source:[/blue] File(s) already uploaded for a previous parameter"
+        )
+    else:
+        sandbox_future = executor.submit(_upload_sandbox, file_paths)
+        uploaded_sandboxes[sandbox_key] = sandbox_future
 
-        file.path = str(Path(".") / file.path.split("/")[-1])
+    # Modify the location of the files to point to their future location on the
+    # worker node
+    for file, file_path in zip(files, file_paths):
+        file.path = str(Path(".") / file_path.name)
+    return sandbox_future
 
-    sandbox_id = sandbox_path.name.replace(".tar.gz", "")
-    return sandbox_id
+
+def _upload_sandbox(file_paths: List[Path]) -> str:
+    """
+    Tar the files and upload them to the sandbox store.
+
+    :param file_paths: The paths of the files to upload
+
+    :return: The sandbox id
+    """
+    Path("sandboxstore").mkdir(exist_ok=True)
+
+    # The name has to be unique as several sandboxes can be uploaded concurrently
+    fd, sandbox_name = tempfile.mkstemp(
+        prefix="input_sandbox_", suffix=".tar", dir="sandboxstore"
+    )
+    # mkstemp() makes the file private: give it the permissions of a regular file
+    os.fchmod(fd, 0o666 & ~UMASK)
+    os.close(fd)
+    sandbox_path = Path(sandbox_name)
+    # Inputs are often already compressed (ROOT, HDF5...) and the sandbox is transient:
+    # store them as-is rather than paying a gzip pass on every byte
+    try:
+        with tarfile.TarFile(
+            sandbox_path, "w", copybufsize=SANDBOX_COPY_BUFSIZE
+        ) as tar:
+            for file_path in file_paths:
+                console.print(
+                    f"\t\t[blue]:information_source:[/blue] Found {file_path} locally, "
+                    "uploading it to the sandbox store..."
+                )
+                # Open the file once: metadata come from fstat, no extra lookup by path
+                with open(file_path, "rb") as file_obj:
+                    tar.addfile(
+                        tar.gettarinfo(arcname=file_path.name, fileobj=file_obj),
+                        file_obj,
+                    )
+    except BaseException:
+        # Do not leave an incomplete sandbox in the store
+        sandbox_path.unlink(missing_ok=True)
+        raise
+    console.print(
+        f"\t\t[blue]:information_source:[/blue] File(s) will be available through {sandbox_path}"
+    )
+
+    return sandbox_path.stem
 
 
 # -----------------------------------------------------------------------------
@@ -203,34 +303,30 @@ def submit_job_router(job: JobSubmissionModel) -> bool:
 
     :return: True if the job executed successfully, False otherwise
     """
-    logger = logging.getLogger("JobRouter")
 
     # Validate the jobs
-    logger.info("Validating the job(s)...")
+    router_logger.info("Validating the job(s)...")
     # Initiate 1 job per parameter
     jobs = []
     if not job.parameters:
         jobs.append(job)
     else:
+        # The job is already validated: copy it rather than validating the task again
         for parameter in job.parameters:
-            jobs.append(
-                JobSubmissionModel(
-                    task=job.task,
-                    parameters=[parameter],
-                    description=job.description,
-                    metadata=job.metadata,
-                )
-            )
-    logger.info("Job(s) validated!")
+            jobs.append(job.model_copy(update={"parameters": [parameter]}))
+    router_logger.info("Job(s) validated!")
 
     # Simulate the submission of the job (just execute the job locally)
-    logger.info("Running jobs...")
-    results = []
-    for job in jobs:
-        logger.info("Running job:\n")
-        print_json(job.model_dump_json(indent=4))
-        results.append(run_job(job))
-    logger.info("Jobs done.")
+    # Jobs are independent and mostly wait on cwltool: run them concurrently
+    router_logger.info("Running jobs...")
+    # The jobs share the same task: convert it once for all of them
+    task_dict = save(job.task)
+    router_logger.debug("Running %d job(s) of task %s", len(jobs), job.task.id)
+    # Each job runs a cwltool process: do not start more of them than there are CPUs
+    max_workers = min(len(jobs), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_job, jobs, repeat(task_dict)))
+    router_logger.info("Jobs done.")
 
     return all(results)
 
@@ -276,74 +372,129 @@ def _pre_process(
     arguments: JobParameterModel | None,
     job_exec_coordinator: JobExecutionCoordinator,
     job_path: Path,
+    task_dict: Dict[str, Any] | None = None,
 ) -> List[str]:
     """
     Pre-process the job before execution.
 
+    :param task_dict: The executable already converted by save(), if available
+
     :return: True if the job is pre-processed successfully, False otherwise
     """
-    logger = logging.getLogger("JobWrapper - Pre-process")
 
-    # Prepare the task for cwltool
-    logger.info("Preparing the task for cwltool...")
     command = ["cwltool"]
-
-    task_dict = save(executable)
-    task_path = job_path / "task.cwl"
-    with open(task_path, "w") as task_file:
-        YAML().dump(task_dict, task_file)
-    command.append(str(task_path.name))
-
-    if arguments:
-        if arguments.sandbox:
-            # Download the files from the sandbox store
-            logger.info("Downloading the files from the sandbox store...")
-            for sandbox in arguments.sandbox:
-                sandbox_path = Path("sandboxstore") / f"{sandbox}.tar.gz"
-                with tarfile.open(sandbox_path, "r:gz") as tar:
-                    tar.extractall(job_path)
-            logger.info("Files downloaded successfully!")
-
-        # Download input data from the file catalog
-        logger.info("Downloading input data from the file catalog...")
-        input_data = []
-        for _, input_value in arguments.cwl.items():
-            input = input_value
-            if not isinstance(input_value, list):
-                input = [input_value]
-
-            for item in input:
-                if not isinstance(item, File):
-                    continue
-
+    with ThreadPoolExecutor() as executor:
+        downloads = []
+        if arguments:
+            if arguments.sandbox:
+                # Download the files from the sandbox store
+                pre_process_logger.info(
+                    "Downloading the files from the sandbox store..."
+                )
+                for sandbox in arguments.sandbox:
+                    _extract_sandbox(Path("sandboxstore") / f"{sandbox}.tar", job_path)
+                pre_process_logger.info("Files downloaded successfully!")
+
+            # Download input data from the file catalog
+            pre_process_logger.info("Downloading input data from the file catalog...")
+            # Inputs are downloaded by name: a file listed twice is fetched once and,
+            # as when they were copied one after the other, the last input wins
+            input_paths: Dict[str, Path] = {}
+            for file in _get_files(arguments.cwl):
                 # TODO: path is not the only attribute to consider, but so far it is the only one used
-                if not item.path:
+                if not file.path:
                     raise NotImplementedError("File path is not defined.")
 
-                input_path = Path(item.path)
+                input_path = Path(file.path)
                 if "filecatalog" in input_path.parts:
-                    input_data.append(item)
+                    input_paths[input_path.name] = input_path
+                    file.path = input_path.name
+
+            # The inputs are known upfront: start fetching them right away, the
+            # transfers run while the task is being prepared
+            for input_path in input_paths.values():
+                downloads.append(
+                    executor.submit(_download_input_file, input_path, job_path)
+                )
+
+        # Prepare the task for cwltool
+        pre_process_logger.info("Preparing the task for cwltool...")
+
+        # JSON is valid CWL and much faster to emit than YAML
+        if task_dict is None:
+            task_dict = save(executable)
+        task_path = job_path / "task.cwl"
+        with open(task_path, "w") as task_file:
+            json.dump(task_dict, task_file)
+        command.append(str(task_path.name))
 
-        for file in input_data:
-            # TODO: path is not the only attribute to consider, but so far it is the only one used
-            if not file.path:
-                raise NotImplementedError("File path is not defined.")
+        # Wait for the transfers and raise any download error
+        for download in downloads:
+            download.result()
 
-            input_path = Path(file.path)
-            shutil.copy(input_path, job_path / input_path.name)
-            file.path = file.path.split("/")[-1]
-        logger.info("Input data downloaded successfully!")
+    if arguments:
+        pre_process_logger.info("Input data downloaded successfully!")
 
         # Prepare the parameters for cwltool
-        logger.info("Preparing the parameters for cwltool...")
+        pre_process_logger.info("Preparing the parameters for cwltool...")
         parameter_dict = save(cast(Saveable, arguments.cwl))
         parameter_path = job_path / "parameter.cwl"
         with open(parameter_path, "w") as parameter_file:
-            YAML().dump(parameter_dict, parameter_file)
+            json.dump(parameter_dict, parameter_file)
         command.append(str(parameter_path.name))
     return job_exec_coordinator.pre_process(job_path, command)
 
 
+def _extract_sandbox(sandbox_path: Path, job_path: Path):
+    """
+    Extract a sandbox in the job directory.
+
+    :param sandbox_path: The path to the sandbox
+    :param job_path: The path to the job directory
+    """
+    with open(sandbox_path, "rb") as sandbox_file:
+        # The sandbox is read once, sequentially: let the kernel read it ahead
+        if hasattr(os, "posix_fadvise"):
+            fd = sandbox_file.fileno()
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+
+        # Read the sandbox as a stream: a single sequential pass, and copy its members
+        # by 2 MiB chunks
+        with tarfile.open(
+            fileobj=sandbox_file,
+            mode="r|",
+            bufsize=SANDBOX_COPY_BUFSIZE,
+            copybufsize=SANDBOX_COPY_BUFSIZE,
+        ) as tar:
+            # The sandbox is built by _upload_sandbox() but found from an id coming
+            # from the submission: only extract plain data inside the job directory
+            tar.extractall(job_path, filter="data")
+
+
+def _download_input_file(input_path: Path, job_path: Path):
+    """
+    Download an input file from the file catalog to the job directory.
+
+    :param input_path: The path to the file in the file catalog
+    :param job_path: The path to the job directory
+    """
+    dest = job_path / input_path.name
+    if dest.exists():
+        if os.path.samefile(input_path, dest):
+            return
+        # Never write through an existing file: it may be a link to another input
+        dest.unlink()
+
+    # A hard link shares the data instead of copying it, and removing the job directory
+    # leaves the original untouched: only copy when it cannot be done (other filesystem,
+    # too many links, not supported...). dest does not exist anymore at this point.
+    try:
+        os.link(input_path, dest)
+    except OSError:
+        shutil.copy(input_path, dest)
+
+
 def _post_process(
     status: int,
     stdout: str,
@@ -356,68 +507,121 @@ def _post_process(
 
     :return: True if the job is post-processed successfully, False otherwise
     """
-    logger = logging.getLogger("JobWrapper - Post-process")
     if status != 0:
         raise RuntimeError(f"Error {status} during the task execution.")
 
-    logger.info(stdout)
-    logger.info(stderr)
+    post_process_logger.info(stdout)
+    post_process_logger.info(stderr)
 
     job_exec_coordinator.post_process(job_path)
 
 
-def run_job(job: JobSubmissionModel) -> bool:
+def _read_log_tail(log_path: Path, size: int = 64 * 1024) -> str:
+    """
+    Read the end of a log file.
+
+    :param log_path: The path to the log file
+    :param size: The maximum number of bytes to read
+
+    :return: The last size bytes of the log
+    """
+    with open(log_path, "rb") as log_file:
+        end = log_file.seek(0, os.SEEK_END)
+        log_file.seek(max(end - size, 0))
+        return log_file.read().decode(errors="replace")
+
+
+def _cleanup_job_path(job_path: Path):
+    """
+    Remove a job directory without waiting for its content to be deleted.
+
+    The directory is moved to a "graveyard" (a rename, whatever its size) and then
+    removed by a background thread. The first time a graveyard is used, the
+    directories an interrupted run left in it are removed as well.
+
+    :param job_path: The path to the job directory
+    """
+    graveyard_path = job_path.parent / ".graveyard"
+    graveyard_path.mkdir(exist_ok=True)
+    if graveyard_path not in reaped_graveyards:
+        reaped_graveyards.add(graveyard_path)
+        # Directories left by an interrupted run would never be removed otherwise
+        for leftover_path in graveyard_path.iterdir():
+            cleanup_executor.submit(shutil.rmtree, leftover_path, ignore_errors=True)
+    try:
+        job_path = job_path.rename(graveyard_path / job_path.name)
+    except OSError:
+        # Cannot be renamed (e.g. cross-device): remove it in place
+        shutil.rmtree(job_path, ignore_errors=True)
+        return
+    cleanup_executor.submit(shutil.rmtree, job_path, ignore_errors=True)
+
+
+def run_job(job: JobSubmissionModel, task_dict: Dict[str, Any] | None = None) -> bool:
     """
     Executes a given CWL workflow using cwltool.
     This is the equivalent of the DIRAC JobWrapper.
 
+    :param task_dict: The task already converted by save(), if available
+
     :return: True if the job is executed successfully, False otherwise
     """
-    logger = logging.getLogger("JobWrapper")
     job_exec_coordinator = JobExecutionCoordinator(job)
 
     # Isolate the job in a specific directory
-    job_path = Path(".") / "workernode" / f"{random.randint(1000, 9999)}"
-    job_path.mkdir(parents=True, exist_ok=True)
+    # The name has to be unique as several jobs can run concurrently
+    Path("workernode").mkdir(exist_ok=True)
+    job_path = Path(tempfile.mkdtemp(prefix="job_", dir="workernode"))
 
     try:
         # Pre-process the job
-        logger.info("Pre-processing Task...")
+        wrapper_logger.info("Pre-processing Task...")
         command = _pre_process(
             job.task,
             job.parameters[0] if job.parameters else None,
             job_exec_coordinator,
             job_path,
+            task_dict,
         )
-        logger.info("Task pre-processed successfully!")
+        wrapper_logger.info("Task pre-processed successfully!")
 
         # Execute the task
-        logger.info(f"Executing Task: {command}")
-        result = subprocess.run(command, capture_output=True, text=True, cwd=job_path)
+        # cwltool outputs can be large: spool them to disk instead of buffering them
+        wrapper_logger.info("Executing Task: %s", command)
+        stdout_path = job_path / "cwltool.out"
+        stderr_path = job_path / "cwltool.err"
+        with open(stdout_path, "wb") as stdout_file, open(
+            stderr_path, "wb"
+        ) as stderr_file:
+            result = subprocess.run(
+                command, stdout=stdout_file, stderr=stderr_file, cwd=job_path
+            )
+        stdout = _read_log_tail(stdout_path)
+        stderr = _read_log_tail(stderr_path)
 
         if result.returncode != 0:
-            logger.error(
-                f"Error in executing workflow:\n{Text.from_ansi(result.stderr)}"
+            wrapper_logger.error(
+                "Error in executing workflow:\n%s", Text.from_ansi(stderr)
             )
             return False
-        logger.info("Task executed successfully!")
+        wrapper_logger.info("Task executed successfully!")
 
         # Post-process the job
-        logger.info("Post-processing Task...")
+        wrapper_logger.info("Post-processing Task...")
         _post_process(
             result.returncode,
-            result.stdout,
-            result.stderr,
+            stdout,
+            stderr,
             job_path,
             job_exec_coordinator,
         )
-        logger.info("Task post-processed successfully!")
+        wrapper_logger.info("Task post-processed successfully!")
         return True
 
     except Exception:
-        logger.exception("JobWrapper: Failed to execute workflow")
+        wrapper_logger.exception("JobWrapper: Failed to execute workflow")
         return False
     finally:
         # Clean up
         if job_path.exists():
-            shutil.rmtree(job_path)
+            _cleanup_job_path(job_path)
@@ -1,4 +1,5 @@
 import glob
+import json
 import logging
 import math
 import os
@@ -10,7 +11,6 @@ from cwl_utils.parser import load_document_by_uri, save
 from cwl_utils.parser.cwl_v1_2 import Saveable
 from cwl_utils.parser.cwl_v1_2_utils import load_inputfile
 from pydantic import BaseModel
-from ruamel.yaml import YAML
 
 # -----------------------------------------------------------------------------
 # Metadata models (Job Type)
@@ -60,7 +60,7 @@ class IMetadataModel(BaseModel):
         output_value = Path(src).name
         dest = output_path / output_value
         os.rename(src, dest)
-        logging.info(f"Output stored in {dest}")
+        logging.info("Output stored in %s", dest)
 
 
 # -----------------------------------------------------------------------------
@@ -204,7 +204,7 @@ class LHCbSimulate(IMetadataModel):
         # Save the parameters to the file
         parameter_dict = save(cast(Saveable, parameters))
         with open(parameters_path, "w") as parameter_file:
-            YAML().dump(parameter_dict, parameter_file)
+            json.dump(parameter_dict, parameter_file)
 
         return command
 
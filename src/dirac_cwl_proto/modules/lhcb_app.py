@@ -265,7 +265,7 @@ def install_dependencies(secondary_files):
     for secondary_file in secondary_files:
         secondary_file_path = Path(secondary_file)
         if not secondary_file_path.is_file():
-            logging.error(f"File {secondary_file} does not exist")
+            logging.error("File %s does not exist", secondary_file)
             return False
 
         # Already present in the current working directory
@@ -273,7 +273,7 @@ def install_dependencies(secondary_files):
             continue
 
         # Copy the file to the current working directory
-        logging.info(f"Copying {secondary_file} to the current working directory")
+        logging.info("Copying %s to the current working directory", secondary_file)
         shutil.copy(secondary_file, ".")
     return True
 
@@ -320,7 +320,7 @@ def build_gaudi_extra_options(
         run_number=run_number,
         first_event_number=first_event_number,
     )
-    logging.info(f"Project options: {projectOpts}")
+    logging.info("Project options: %s", projectOpts)
 
     generated_options_file = "gaudi_extra_options.py"
     with open(generated_options_file, "w") as options:
@@ -353,7 +353,7 @@ def get_event_selector_input(input_data: list[str]) -> str:
     data using Gaudi applications."""
     options = []
     for lfn in input_data:
-        lfn = lfn.replace("LFN:", "").replace("lfn:", "")
+        lfn = lfn.removeprefix("LFN:").removeprefix("lfn:")
 
         data_type = lfn.split(".")[-1]
         if data_type == "MDF":
@@ -511,7 +511,7 @@ def build_prodconf_json(
         options=options,
     )
     prod_info_dict = prod_info.model_dump()
-    logging.info(f"prodConf content: {prod_info_dict}")
+    logging.info("prodConf content: %s", prod_info_dict)
 
     # Write the prodconf.json file
     prodconf_file = f"prodConf_{output_file_prefix}.json"
@@ -542,7 +542,7 @@ async def run_lbprodrun(
             "./prmon_Gauss.json",
             "--",
         ] + command
-    logging.info(f"Running command {shlex.join(command)}")
+    logging.info("Running command %s", shlex.join(command))
 
     stdout = ""
     stderr = ""
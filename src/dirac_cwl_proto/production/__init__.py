@@ -49,6 +49,9 @@ def submit_production_client(
     local: Optional[bool] = typer.Option(
         True, help="Run the job locally instead of submitting it to the router"
     ),
+    verbose: Optional[bool] = typer.Option(
+        False, help="Print the full description of the production before submission"
+    ),
 ):
     """
     Correspond to the dirac-cli command to submit productions
@@ -97,7 +100,8 @@ def submit_production_client(
     console.print(
         "[blue]:information_source:[/blue] [bold]CLI:[/bold] Submitting the production..."
     )
-    print_json(transformation.model_dump_json(indent=4))
+    if verbose:
+        print_json(transformation.model_dump_json())
     if not submit_production_router(transformation):
         console.print(
             "[red]:heavy_multiplication_x:[/red] [bold]CLI:[/bold] Failed to run production."
@@ -130,7 +134,7 @@ def submit_production_router(production: ProductionSubmissionModel) -> bool:
     # Split the production into transformations
     logger.info("Creating transformations from production...")
     transformations = _get_transformations(production)
-    logger.info(f"{len(transformations)} transformations created!")
+    logger.info("%d transformations created!", len(transformations))
 
     # Submit the transformations
     logger.info("Submitting transformations...")
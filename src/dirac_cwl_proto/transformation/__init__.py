@@ -54,6 +54,9 @@ def submit_transformation_client(
     local: Optional[bool] = typer.Option(
         True, help="Run the jobs locally instead of submitting them to the router"
     ),
+    verbose: Optional[bool] = typer.Option(
+        False, help="Print the full description of the transformation before submission"
+    ),
 ):
     """
     Correspond to the dirac-cli command to submit transformations
@@ -105,7 +108,8 @@ def submit_transformation_client(
     console.print(
         "[blue]:information_source:[/blue] [bold]CLI:[/bold] Submitting the transformation..."
     )
-    print_json(transformation.model_dump_json(indent=4))
+    if verbose:
+        print_json(transformation.model_dump_json())
     if not submit_transformation_router(transformation):
         console.print(
             "[red]:heavy_multiplication_x:[/red] [bold]CLI:[/bold] Failed to run transformation."
@@ -152,19 +156,19 @@ def submit_transformation_router(transformation: TransformationSubmissionModel)
         min_length = None
         for input_name, group_size in transformation.metadata.group_size.items():
             # Get input query
-            logger.info(f"\t- Getting input query for {input_name}...")
+            logger.info("\t- Getting input query for %s...", input_name)
             input_query = transformation_metadata.get_input_query(input_name)
             if not input_query:
                 raise RuntimeError("Input query not found.")
 
             # Wait for the input to be available
-            logger.info(f"\t- Waiting for input data for {input_name}...")
-            logger.debug(f"\t\t- Query: {input_query}")
-            logger.debug(f"\t\t- Group Size: {group_size}")
+            logger.info("\t- Waiting for input data for %s...", input_name)
+            logger.debug("\t\t- Query: %s", input_query)
+            logger.debug("\t\t- Group Size: %s", group_size)
             while not (inputs := _get_inputs(input_query, group_size)):
-                logger.debug(f"\t\t- Result: {inputs}")
+                logger.debug("\t\t- Result: %s", inputs)
                 time.sleep(5)
-            logger.info(f"\t- Input data for {input_name} available.")
+            logger.info("\t- Input data for %s available.", input_name)
             if not min_length or len(inputs) < min_length:
                 min_length = len(inputs)
 
@@ -1,13 +1,29 @@
 import re
 import shutil
+import tarfile
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
+from cwl_utils.parser import load_document_by_uri
+from cwl_utils.parser.cwl_v1_2 import File
 from typer.testing import CliRunner
 
 from dirac_cwl_proto import app
+from dirac_cwl_proto.job import (
+    cleanup_executor,
+    reaped_graveyards,
+    submit_job_router,
+    upload_local_input_files,
+)
+from dirac_cwl_proto.submission_models import (
+    JobDescriptionModel,
+    JobMetadataModel,
+    JobParameterModel,
+    JobSubmissionModel,
+)
 
 
 @pytest.fixture()
@@ -175,6 +191,179 @@ def test_run_job_validation_failure(
     ), "The expected error was not found."
 
 
+def test_run_job_shared_sandbox(cli_runner, cleanup, tmp_path):
+    input_data = [
+        Path(f"test/workflows/pi/type_dependencies/job/result_{i}.sim").resolve()
+        for i in range(1, 4)
+    ]
+
+    # Two parameter files using the same local files (in a different order)
+    command = ["job", "submit", "test/workflows/pi/pi_gather/pigather.cwl"]
+    for name, paths in [
+        ("inputs1.yaml", input_data),
+        ("inputs2.yaml", input_data[::-1]),
+    ]:
+        parameter_path = tmp_path / name
+        parameter_path.write_text(
+            "input-data:\n"
+            + "".join(f"  - class: File\n    path: {path}\n" for path in paths)
+        )
+        command.extend(["--parameter-path", str(parameter_path)])
+
+    result = cli_runner.invoke(app, command)
+    assert "Job(s) done" in result.stdout, f"Failed to run the job: {result.stdout}"
+
+    # The files are uploaded once for both parameters
+    sandboxes = list(Path("sandboxstore").glob("*.tar"))
+    assert len(sandboxes) == 1, f"Expected a single sandbox, got {sandboxes}"
+
+
+def test_upload_local_input_files_order(cleanup, tmp_path):
+    parameters = []
+    for i in range(1, 6):
+        input_path = tmp_path / f"input_{i}.txt"
+        input_path.write_text(f"{i}\n")
+        parameters.append({"input": File(path=str(input_path))})
+
+    # The uploads run concurrently
+    uploaded_sandboxes = {}
+    with ThreadPoolExecutor() as executor:
+        sandbox_futures = [
+            upload_local_input_files(parameter, executor, uploaded_sandboxes)
+            for parameter in parameters
+        ]
+
+    # Each parameter gets the sandbox containing its own files
+    for i, (parameter, sandbox_future) in enumerate(
+        zip(parameters, sandbox_futures), start=1
+    ):
+        assert parameter["input"].path == f"input_{i}.txt"
+        sandbox_path = Path("sandboxstore") / f"{sandbox_future.result()}.tar"
+        with tarfile.open(sandbox_path) as tar:
+            assert tar.getnames() == [f"input_{i}.txt"]
+
+
+def test_upload_local_input_files_linked_names(cleanup, tmp_path):
+    # The same file reached through two different names
+    input_path = tmp_path / "a.sim"
+    input_path.write_text("1\n")
+    link_path = tmp_path / "b.sim"
+    link_path.symlink_to(input_path)
+    parameters = [
+        {"input": File(path=str(input_path))},
+        {"input": File(path=str(link_path))},
+    ]
+
+    uploaded_sandboxes = {}
+    with ThreadPoolExecutor() as executor:
+        sandbox_futures = [
+            upload_local_input_files(parameter, executor, uploaded_sandboxes)
+            for parameter in parameters
+        ]
+
+    # Each parameter finds its file in its sandbox under the name it uses
+    for parameter, sandbox_future in zip(parameters, sandbox_futures):
+        sandbox_path = Path("sandboxstore") / f"{sandbox_future.result()}.tar"
+        with tarfile.open(sandbox_path) as tar:
+            assert parameter["input"].path in tar.getnames()
+
+
+def test_run_job_missing_local_input(cli_runner, cleanup, tmp_path):
+    parameter_path = tmp_path / "inputs.yaml"
+    parameter_path.write_text(
+        f"input-data:\n  - class: File\n    path: {tmp_path / 'missing.sim'}\n"
+    )
+    command = [
+        "job",
+        "submit",
+        "test/workflows/pi/pi_gather/pigather.cwl",
+        "--parameter-path",
+        str(parameter_path),
+    ]
+    result = cli_runner.invoke(app, command)
+
+    # The upload failure is reported by the CLI, not raised
+    assert result.exception is None, f"Unexpected exception: {result.exception}"
+    assert "Job(s) done" not in result.stdout, "The job did complete successfully."
+    assert "Failedtouploadthelocalfiles" in re.sub(
+        r"\s+", "", result.stdout
+    ), "The expected error was not found."
+
+    # No incomplete sandbox is left behind
+    sandboxes = list(Path("sandboxstore").glob("*.tar"))
+    assert not sandboxes, f"Incomplete sandbox(es) left: {sandboxes}"
+
+
+def test_run_job_reaps_graveyard(cli_runner, cleanup):
+    # A job directory left over by an interrupted run
+    leftover_path = Path("workernode/.graveyard/job_leftover")
+    leftover_path.mkdir(parents=True)
+    (leftover_path / "cwltool.out").write_text("")
+    reaped_graveyards.clear()
+
+    command = [
+        "job",
+        "submit",
+        "test/workflows/helloworld/helloworld_basic/description.cwl",
+    ]
+    result = cli_runner.invoke(app, command)
+    assert "Job(s) done" in result.stdout, f"Failed to run the job: {result.stdout}"
+
+    # Wait for the background removals
+    cleanup_executor.submit(lambda: None).result()
+    assert not leftover_path.exists(), "The leftover job directory was not removed."
+
+
+@pytest.mark.parametrize(
+    "source_input_data, input_data",
+    [
+        # Two inputs from different directories of the file catalog share their name
+        (
+            {
+                "test/workflows/pi/type_dependencies/job/result_1.sim": "filecatalog/pi/1/result_1.sim",
+                "test/workflows/pi/type_dependencies/job/result_2.sim": "filecatalog/pi/2/result_1.sim",
+            },
+            ["filecatalog/pi/1/result_1.sim", "filecatalog/pi/2/result_1.sim"],
+        ),
+        # The same input is listed twice
+        (
+            {
+                "test/workflows/pi/type_dependencies/job/result_1.sim": "filecatalog/pi/1/result_1.sim",
+            },
+            ["filecatalog/pi/1/result_1.sim", "filecatalog/pi/1/result_1.sim"],
+        ),
+    ],
+)
+def test_run_job_filecatalog_inputs(cleanup, source_input_data, input_data):
+    # Add the input data to the file catalog
+    for source, destination in source_input_data.items():
+        Path(destination).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(source, destination)
+
+    job = JobSubmissionModel(
+        task=load_document_by_uri("test/workflows/pi/pi_gather/pigather.cwl"),
+        parameters=[
+            JobParameterModel(
+                sandbox=None,
+                cwl={
+                    "input-data": [
+                        File(path=str(Path(path).resolve())) for path in input_data
+                    ]
+                },
+            )
+        ],
+        description=JobDescriptionModel(),
+        metadata=JobMetadataModel(),
+    )
+    assert submit_job_router(job), "Failed to run the job."
+
+    # The job must not modify the input data in the file catalog
+    for source, destination in source_input_data.items():
+        assert (
+            Path(destination).read_bytes() == Path(source).read_bytes()
+        ), f"{destination} was modified by the job."
+
+
 # -----------------------------------------------------------------------------
 # Transformation tests
 # -----------------------------------------------------------------------------
@@ -454,3 +643,55 @@ def test_run_production_validation_failure(
     ) or expected_error in re.sub(
         r"\s+", "", f"{result.exception}"
     ), "The expected error was not found."
+
+
+# -----------------------------------------------------------------------------
+# Verbose tests
+# -----------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "command, expected_output, description_key",
+    [
+        (
+            [
+                "job",
+                "submit",
+                "test/workflows/helloworld/helloworld_basic/description.cwl",
+            ],
+            "Job(s) done",
+            '"parameters"',
+        ),
+        (
+            [
+                "transformation",
+                "submit",
+                "test/workflows/helloworld/helloworld_basic/description.cwl",
+            ],
+            "Transformation done",
+            '"description"',
+        ),
+        (
+            [
+                "production",
+                "submit",
+                "test/workflows/crypto/crypto_complete/description.cwl",
+            ],
+            "Production done",
+            '"steps_metadata"',
+        ),
+    ],
+)
+@pytest.mark.parametrize("verbose", [True, False])
+def test_submit_verbose(
+    cli_runner, cleanup, command, expected_output, description_key, verbose
+):
+    if verbose:
+        command = command + ["--verbose"]
+    result = cli_runner.invoke(app, command)
+    assert expected_output in result.stdout, f"Failed to submit: {result.stdout}"
+
+    # The full description is only printed on demand
+    assert (
+        description_key in result.stdout
+    ) == verbose, f"Unexpected description output with verbose={verbose}."